@@ -0,0 +1,94 @@
+""" The International Standard Atmosphere (ISO 2533), vectorized over altitude.
+
+    standardAtmosphere evaluates the layered model exactly: temperature is piecewise linear in
+    geopotential altitude, and pressure follows from hydrostatic balance, as a power law in
+    layers with a lapse rate and an exponential in isothermal ones. atmosphere interpolates a
+    table of it, precomputed at import, which is what the flow solutions use. Its temperature
+    is exact and its pressure and density, interpolated in their logarithms, agree with the
+    exact model to about 2e-6 relative. Both take geometric altitudes in meters and accept
+    arrays of any shape.
+"""
+
+import numpy as np
+
+SEA_LEVEL_TEMPERATURE = 288.15  # [K]
+SEA_LEVEL_PRESSURE = 101325.0  # [Pa]
+GAS_CONSTANT = 287.05287  # specific gas constant of air [J/(kg K)]
+GRAVITY = 9.80665  # [m/s^2]
+EARTH_RADIUS = 6356766.0  # used to convert to geopotential altitude [m]
+
+# Geopotential altitudes at which each layer starts [m] and its temperature lapse rate [K/m]
+LAYER_BASES = np.array([-2000.0, 11000, 20000, 32000, 47000, 51000, 71000])
+LAPSE_RATES = np.array([-0.0065, 0, 0.001, 0.0028, 0, -0.0028, -0.002])
+
+# Geopotential altitude spacing [m] and top of the interpolation table, just above 86 km geometric
+TABLE_STEP = 50.0
+TABLE_CEILING = 84900.0
+
+
+def geopotentialAltitude(altitude):
+    """ Geopotential altitude [m] of geometric altitudes [m] """
+    altitude = np.asarray(altitude, dtype=float)
+    return EARTH_RADIUS * altitude / (EARTH_RADIUS + altitude)
+
+
+def _layerBases():
+    """ Temperature [K] and pressure [Pa] at the base of every layer """
+    temperatures = [SEA_LEVEL_TEMPERATURE + LAPSE_RATES[0] * LAYER_BASES[0]]
+    pressures = [SEA_LEVEL_PRESSURE * (temperatures[0] / SEA_LEVEL_TEMPERATURE) ** (-GRAVITY / (GAS_CONSTANT *
+                                                                                               LAPSE_RATES[0]))]
+    for layer in range(len(LAYER_BASES) - 1):
+        depth = LAYER_BASES[layer + 1] - LAYER_BASES[layer]
+        temperature, pressure = _withinLayer(layer, depth, temperatures[-1], pressures[-1])
+        temperatures.append(float(temperature))
+        pressures.append(float(pressure))
+    return np.array(temperatures), np.array(pressures)
+
+
+def _withinLayer(layer, height, baseTemperature, basePressure):
+    """ Temperature and pressure at heights above the base of the given layers """
+    lapse = LAPSE_RATES[layer]
+    temperature = baseTemperature + lapse * height
+    isothermal = lapse == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exponent = -GRAVITY / (GAS_CONSTANT * np.where(isothermal, 1, lapse))
+        pressure = np.where(isothermal, basePressure * np.exp(-GRAVITY * height / (GAS_CONSTANT * baseTemperature)),
+                            basePressure * (temperature / baseTemperature) ** exponent)
+    return temperature, pressure
+
+
+BASE_TEMPERATURES, BASE_PRESSURES = _layerBases()
+
+
+def standardAtmosphere(altitude):
+    """ Temperature [K], pressure [Pa] and density [kg/m^3] at geometric altitudes [m], from the layer equations """
+    geopotential = geopotentialAltitude(altitude)
+    layer = np.clip(np.searchsorted(LAYER_BASES, geopotential, side='right') - 1, 0, len(LAYER_BASES) - 1)
+    temperature, pressure = _withinLayer(layer, geopotential - LAYER_BASES[layer], BASE_TEMPERATURES[layer],
+                                         BASE_PRESSURES[layer])
+    return temperature, pressure, pressure / (GAS_CONSTANT * temperature)
+
+
+def _table():
+    """ Temperature, log pressure and log density at evenly spaced geopotential altitudes, one row each """
+    geopotential = np.arange(LAYER_BASES[0], TABLE_CEILING + TABLE_STEP / 2, TABLE_STEP)
+    altitude = EARTH_RADIUS * geopotential / (EARTH_RADIUS - geopotential)
+    temperature, pressure, density = standardAtmosphere(altitude)
+    return np.stack([temperature, np.log(pressure), np.log(density)])
+
+
+ATMOSPHERE_TABLE = _table()
+
+
+def atmosphere(altitude):
+    """ Temperature [K], pressure [Pa] and density [kg/m^3] at geometric altitudes [m], from the table """
+    """ The table is evenly spaced, so every lookup is an index computation rather than a search.
+        Altitudes outside -2 km to 86 km are clamped to that range.
+    """
+    position = (geopotentialAltitude(altitude) - LAYER_BASES[0]) / TABLE_STEP
+    position = np.clip(position, 0, ATMOSPHERE_TABLE.shape[1] - 1)
+    index = np.minimum(position.astype(int), ATMOSPHERE_TABLE.shape[1] - 2)
+    fraction = position - index
+    temperature, logPressure, logDensity = ATMOSPHERE_TABLE[:, index] * (1 - fraction) + \
+        ATMOSPHERE_TABLE[:, index + 1] * fraction
+    return temperature, np.exp(logPressure), np.exp(logDensity)
@@ -0,0 +1,161 @@
+""" Headless analysis service driven by JSON-lines requests.
+
+    Each input line is one request object, for example
+
+        {"id": 7, "m": 0.02, "p": 0.4, "t": 0.12, "alpha": [0, 2, 4], "velocity": 40, "outputs": ["cl", "lift"]}
+
+    with m, p and t as fractions of the chord, c the chord [m] (default 1), N the border points
+    (default 100), alpha in degrees (a number or a list), velocity in m/s (default 1), altitude
+    in m (default 0) and density in kg/m^3 (default that of the standard atmosphere at the
+    altitude). outputs picks from OUTPUTS and defaults to ["cl"]. Each response line echoes the
+    id with either a "result" object, holding one value (or list, for a list of alphas) per
+    output, or an "error" message. Responses are written as requests finish, so they can arrive
+    out of order.
+
+    Requests are solved on a process pool. Every worker keeps its most recently used airfoils,
+    and their panel systems, between requests, and cold airfoils come from the shared panel
+    disk cache. This module and everything it imports must stay free of PyQt and matplotlib.
+"""
+
+import json
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from CFD.atmosphere import atmosphere
+from CFD.NACA_4_Digit import Naca4Digit
+
+OUTPUTS = ("cl", "cp", "x", "y", "lift", "circulation")
+
+# Airfoils each worker keeps warm between requests
+WARM_AIRFOILS = 256
+
+# Requests handed to the pool per worker before reading more input
+IN_FLIGHT_PER_WORKER = 8
+
+# Airfoils warm in this worker process, most recently used last
+warmAirfoils = OrderedDict()
+
+
+def getAirfoil(m, p, t, c, N):
+    """ The worker's airfoil for these parameters, built and solved on first use """
+    key = (m, p, t, c, N)
+    airfoil = warmAirfoils.pop(key, None)
+    if airfoil is None:
+        airfoil = Naca4Digit(m, p, t, c, N)
+        airfoil.getPanelSystem()
+    warmAirfoils[key] = airfoil
+    if len(warmAirfoils) > WARM_AIRFOILS:
+        warmAirfoils.popitem(last=False)
+    return airfoil
+
+
+def solveRequest(request):
+    """ Solve one decoded request and return its result object """
+    outputs = request.get("outputs", ["cl"])
+    unknown = [output for output in outputs if output not in OUTPUTS]
+    if unknown:
+        raise ValueError(f"unknown outputs {unknown}; choose from {list(OUTPUTS)}")
+
+    c = float(request.get("c", 1))
+    airfoil = getAirfoil(float(request["m"]), float(request["p"]), float(request["t"]), c, int(request.get("N", 100)))
+    alpha = request.get("alpha", 0)
+    velocity = float(request.get("velocity", 1))
+    if "density" in request:
+        density = float(request["density"])
+    else:
+        density = float(atmosphere(float(request.get("altitude", 0)))[2])
+
+    system = airfoil.getPanelSystem()
+    cl, cp = system.polar(np.radians(np.atleast_1d(np.asarray(alpha, dtype=float))))
+    values = {"cl": cl, "cp": cp, "lift": 0.5 * density * velocity ** 2 * c * cl,
+              "circulation": 0.5 * velocity * c * cl}
+
+    result = {}
+    for output in outputs:
+        if output in ("x", "y"):
+            result[output] = getattr(system, output)[:, 0].tolist()
+            continue
+        value = values[output]
+        result[output] = value.tolist() if isinstance(alpha, list) else value[0].tolist()
+    return result
+
+
+def handleLine(line):
+    """ Decode, solve and encode one request line; never raises """
+    request = {}
+    try:
+        request = json.loads(line)
+        response = {"id": request.get("id"), "result": solveRequest(request)}
+    except Exception as error:
+        response = {"id": request.get("id") if isinstance(request, dict) else None,
+                    "error": f"{type(error).__name__}: {error}"}
+    return json.dumps(response)
+
+
+def serveStream(lines, write, pool, maxInFlight):
+    """ Submit every request line to the pool, calling write with each response line as it finishes """
+    slots = threading.BoundedSemaphore(maxInFlight)
+    lock = threading.Lock()
+
+    def respond(future):
+        try:
+            response = future.result()
+        except Exception as error:
+            response = json.dumps({"id": None, "error": f"{type(error).__name__}: {error}"})
+        with lock:
+            write(response + "\n")
+        slots.release()
+
+    for line in lines:
+        if not line.strip():
+            continue
+        slots.acquire()
+        pool.submit(handleLine, line).add_done_callback(respond)
+
+    # Every slot is free again once the last response has been written
+    for _ in range(maxInFlight):
+        slots.acquire()
+
+
+def serveStdin(stdin, stdout, workers=None):
+    """ Answer requests from stdin on stdout until end of input """
+    workers = workers or os.cpu_count()
+
+    def write(text):
+        stdout.write(text)
+        stdout.flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        serveStream(stdin, write, pool, IN_FLIGHT_PER_WORKER * workers)
+
+
+def serveSocket(path, workers=None):
+    """ Answer requests from any number of local connections to a unix socket at path """
+    workers = workers or os.cpu_count()
+    if os.path.exists(path):
+        os.remove(path)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                def write(text):
+                    try:
+                        self.wfile.write(text.encode())
+                        self.wfile.flush()
+                    except OSError:
+                        pass
+                serveStream((line.decode() for line in self.rfile), write, pool, IN_FLIGHT_PER_WORKER * workers)
+
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+            server.daemon_threads = True
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(path)
@@ -0,0 +1,241 @@
+""" A two dimensional fast multipole method for sums of point vortices.
+
+    The complex potential of the vortices, F(z) = sum(q*log(z - zj)), carries both fields the
+    solver needs: the stream function is Re(F) and the velocity follows from F'(z), with
+    u = -Im(F') and v = -Re(F'). Sources are binned into a uniform quadtree, multipole expansions
+    are gathered upward, converted to local expansions between well separated boxes and pushed
+    back down to the leaves, where each target evaluates its leaf expansion plus a direct sum
+    over the sources in the neighbouring boxes. The expansion translations follow Greengard and
+    Rokhlin, 'A Fast Algorithm for Particle Simulations' (1987).
+"""
+
+import math
+import numpy as np
+
+# Default relative error tolerance of the far field approximation
+FMM_TOLERANCE = 1e-6
+
+# Largest number of sources allowed in a leaf box before the tree is refined further
+FMM_LEAF_SIZE = 16
+
+# Deepest quadtree level; bounds the size of the dense per level expansion arrays
+FMM_MAX_LEVEL = 8
+
+# Targets handled per block during leaf evaluation
+FMM_TARGET_BLOCK = 65536
+
+# Worst case convergence ratio of an expansion between boxes with one box between them
+FMM_CONVERGENCE_RATIO = 0.4
+
+
+def expansionOrder(tolerance):
+    """ Number of expansion terms needed to reach a relative tolerance """
+    return int(min(40, max(4, math.ceil(math.log(tolerance) / math.log(FMM_CONVERGENCE_RATIO)))))
+
+
+def _binomial(n, k):
+    """ Table of binomial coefficients C(n, k) that is zero outside 0 <= k <= n """
+    n, k = np.broadcast_arrays(n, k)
+    size = int(n.max()) + 1
+    pascal = np.zeros((size + 1, size + 1))
+    pascal[:, 0] = 1
+    for row in range(1, size + 1):
+        pascal[row, 1:] = pascal[row - 1, 1:] + pascal[row - 1, :-1]
+    valid = (n >= 0) & (k >= 0) & (k <= n)
+    return np.where(valid, pascal[np.clip(n, 0, size), np.clip(k, 0, size)], 0)
+
+
+def _multipoleToMultipole(shift, order):
+    """ Matrix moving a multipole expansion to a center offset by -shift (shift = old - new) """
+    l = np.arange(order + 1).reshape(-1, 1)
+    k = np.arange(order + 1).reshape(1, -1)
+    power = np.where(l >= k, l - k, 0)
+    matrix = _binomial(l - 1, k - 1) * shift ** power * (l >= k)
+    matrix = matrix.astype(complex)
+    matrix[0, :] = 0
+    matrix[0, 0] = 1
+    matrix[1:, 0] = -shift ** l[1:, 0] / l[1:, 0]
+    return matrix
+
+
+def _multipoleToLocal(shift, order):
+    """ Matrix converting a multipole expansion centered at shift (source - local) into a local expansion """
+    l = np.arange(order + 1).reshape(-1, 1)
+    k = np.arange(1, order + 1).reshape(1, -1)
+    matrix = np.zeros((order + 1, order + 1), dtype=complex)
+    matrix[:, 1:] = (-1.0) ** k * _binomial(l + k - 1, k - 1) / shift ** (l + k)
+    matrix[0, 0] = np.log(-shift)
+    matrix[1:, 0] = -1 / (l[1:, 0] * shift ** l[1:, 0])
+    return matrix
+
+
+def _localToLocal(shift, order):
+    """ Matrix moving a local expansion to a center offset by shift (shift = new - old) """
+    l = np.arange(order + 1).reshape(-1, 1)
+    k = np.arange(order + 1).reshape(1, -1)
+    power = np.where(k >= l, k - l, 0)
+    return (_binomial(k, l) * shift ** power * (k >= l)).astype(complex)
+
+
+def _boxIndices(z, lower, size, level):
+    """ Integer box coordinates of points at a tree level """
+    boxes = 2 ** level
+    ix = np.clip(((z.real - lower.real) / size * boxes).astype(int), 0, boxes - 1)
+    iy = np.clip(((z.imag - lower.imag) / size * boxes).astype(int), 0, boxes - 1)
+    return ix, iy
+
+
+def _boxCenters(ix, iy, lower, size, level):
+    """ Complex centers of boxes at a tree level """
+    width = size / 2 ** level
+    return lower + width * (ix + 0.5) + 1j * width * (iy + 0.5)
+
+
+def vortexField(xv, yv, strengths, xt, yt, tolerance=FMM_TOLERANCE, leafSize=FMM_LEAF_SIZE):
+    """ Approximate the stream function and velocity of point vortices at target points """
+    """ Uses the same conventions as Naca4Digit.superposeVortices: strengths has one row per
+        vortex and one column per set of circulations, and each output has shape
+        (columns,) + xt.shape.
+    """
+    zs = np.ravel(xv).astype(float) + 1j * np.ravel(yv).astype(float)
+    weights = np.asarray(strengths, dtype=float).reshape(len(zs), -1) / (2 * np.pi)
+    zt = np.ravel(xt).astype(float) + 1j * np.ravel(yt).astype(float)
+    columns = weights.shape[1]
+    order = expansionOrder(tolerance)
+
+    # Bounding square of every source and target
+    allPoints = np.concatenate((zs, zt))
+    lower = complex(allPoints.real.min(), allPoints.imag.min())
+    size = max(np.ptp(allPoints.real), np.ptp(allPoints.imag)) * (1 + 1e-9) or 1.0
+
+    # Refine until no leaf holds more than leafSize sources
+    levels = 2
+    while levels < FMM_MAX_LEVEL:
+        ix, iy = _boxIndices(zs, lower, size, levels)
+        if np.bincount(iy * 2 ** levels + ix).max() <= leafSize:
+            break
+        levels += 1
+
+    # Upward pass: leaf multipoles from the sources, then merged into their parents
+    ix, iy = _boxIndices(zs, lower, size, levels)
+    leafIds = iy * 2 ** levels + ix
+    relative = zs - _boxCenters(ix, iy, lower, size, levels)
+    multipoles = [None] * (levels + 1)
+    multipoles[levels] = np.zeros((4 ** levels, order + 1, columns), dtype=complex)
+    powers = relative.reshape(-1, 1) ** np.arange(1, order + 1)
+    np.add.at(multipoles[levels][:, 0, :], leafIds, weights)
+    for k in range(1, order + 1):
+        np.add.at(multipoles[levels][:, k, :], leafIds, -weights * (powers[:, k - 1] / k).reshape(-1, 1))
+
+    for level in range(levels, 2, -1):
+        width = size / 2 ** level
+        boxes = 2 ** level
+        parent = np.zeros((4 ** (level - 1), order + 1, columns), dtype=complex)
+        children = multipoles[level].reshape(boxes, boxes, order + 1, columns)
+        parentView = parent.reshape(boxes // 2, boxes // 2, order + 1, columns)
+        for qy in (0, 1):
+            for qx in (0, 1):
+                shift = width * ((qx - 0.5) + 1j * (qy - 0.5))
+                matrix = _multipoleToMultipole(shift, order)
+                parentView += np.einsum('ij,yxjc->yxic', matrix, children[qy::2, qx::2])
+        multipoles[level - 1] = parent
+
+    # Interaction lists: children of the parent's neighbours that are not neighbours themselves
+    locals_ = [None] * (levels + 1)
+    for level in range(2, levels + 1):
+        width = size / 2 ** level
+        boxes = 2 ** level
+        local = np.zeros((boxes, boxes, order + 1, columns), dtype=complex)
+        source = multipoles[level].reshape(boxes, boxes, order + 1, columns)
+        occupied = np.argwhere(np.any(source != 0, axis=(2, 3)))
+        for dy in range(-3, 4):
+            for dx in range(-3, 4):
+                if abs(dx) <= 1 and abs(dy) <= 1:
+                    continue
+                # Target box t receives from source box s = t + (dx, dy)
+                ty = occupied[:, 0] - dy
+                tx = occupied[:, 1] - dx
+                valid = (tx >= 0) & (tx < boxes) & (ty >= 0) & (ty < boxes)
+                valid &= (np.abs((tx + dx) // 2 - tx // 2) <= 1) & (np.abs((ty + dy) // 2 - ty // 2) <= 1)
+                if not np.any(valid):
+                    continue
+                matrix = _multipoleToLocal(width * (dx + 1j * dy), order)
+                sy, sx = occupied[valid, 0], occupied[valid, 1]
+                local[ty[valid], tx[valid]] += np.einsum('ij,njc->nic', matrix, source[sy, sx])
+        locals_[level] = local
+
+    # Downward pass: parents hand their local expansions to their children
+    for level in range(3, levels + 1):
+        width = size / 2 ** level
+        parent = locals_[level - 1]
+        for qy in (0, 1):
+            for qx in (0, 1):
+                shift = width * ((qx - 0.5) + 1j * (qy - 0.5))
+                matrix = _localToLocal(shift, order)
+                locals_[level][qy::2, qx::2] += np.einsum('ij,yxjc->yxic', matrix, parent)
+    leafLocal = locals_[levels].reshape(4 ** levels, order + 1, columns)
+
+    # Sources grouped by leaf box and padded into a dense table for the near field
+    order_ = np.argsort(leafIds, kind='stable')
+    occupiedLeaves, starts, counts = np.unique(leafIds[order_], return_index=True, return_counts=True)
+    slots = np.arange(len(zs)) - np.repeat(starts, counts)
+    padded = np.full((len(occupiedLeaves), counts.max()), np.nan + 0j)
+    paddedWeights = np.zeros((len(occupiedLeaves), counts.max(), columns))
+    padded[np.repeat(np.arange(len(occupiedLeaves)), counts), slots] = zs[order_]
+    paddedWeights[np.repeat(np.arange(len(occupiedLeaves)), counts), slots] = weights[order_]
+
+    potential = np.empty((columns, len(zt)), dtype=complex)
+    derivative = np.empty((columns, len(zt)), dtype=complex)
+    boxes = 2 ** levels
+    for start in range(0, len(zt), FMM_TARGET_BLOCK):
+        z = zt[start:start + FMM_TARGET_BLOCK]
+        tx, ty = _boxIndices(z, lower, size, levels)
+        w = z - _boxCenters(tx, ty, lower, size, levels)
+        coefficients = leafLocal[ty * boxes + tx]
+
+        # Far field: Horner evaluation of the local expansion and its derivative
+        value = coefficients[:, order, :].copy()
+        slope = np.zeros_like(value)
+        for k in range(order - 1, -1, -1):
+            slope = slope * w[:, None] + value
+            value = value * w[:, None] + coefficients[:, k, :]
+
+        # Near field: direct sum over the sources in the 3x3 neighbourhood
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                nx, ny = tx + dx, ty + dy
+                inside = (nx >= 0) & (nx < boxes) & (ny >= 0) & (ny < boxes)
+                neighbour = np.where(inside, ny * boxes + nx, -1)
+                slot = np.clip(np.searchsorted(occupiedLeaves, neighbour), 0, len(occupiedLeaves) - 1)
+                hit = np.flatnonzero(inside & (occupiedLeaves[slot] == neighbour))
+                if hit.size == 0:
+                    continue
+                separation = z[hit, None] - padded[slot[hit]]
+                present = ~np.isnan(separation)
+                separation = np.where(present, separation, 1.0)
+                value[hit] += np.einsum('tj,tjc->tc', np.log(separation) * present, paddedWeights[slot[hit]])
+                slope[hit] += np.einsum('tj,tjc->tc', present / separation, paddedWeights[slot[hit]])
+
+        potential[:, start:start + FMM_TARGET_BLOCK] = value.T
+        derivative[:, start:start + FMM_TARGET_BLOCK] = slope.T
+
+    shape = (columns,) + np.shape(xt)
+    return (potential.real.reshape(shape), -derivative.imag.reshape(shape),
+            -derivative.real.reshape(shape))
+
+
+def accuracyReport(xv, yv, strengths, xt, yt, fields, samples=2000, seed=0):
+    """ Compare approximate (stream, velocityX, velocityY) fields against the direct sum at sampled targets """
+    from CFD.NACA_4_Digit import Naca4Digit
+
+    xFlat = np.ravel(xt)
+    picks = np.random.default_rng(seed).choice(xFlat.size, size=min(samples, xFlat.size), replace=False)
+    exact = Naca4Digit.superposeVortices(xv, yv, strengths, xFlat[picks], np.ravel(yt)[picks])
+
+    report = {"samples": len(picks)}
+    for name, approximate, reference in zip(("stream", "velocityX", "velocityY"), fields, exact):
+        approximate = approximate.reshape(len(approximate), -1)[:, picks]
+        error = np.max(np.abs(approximate - reference))
+        report[name] = {"maxAbsError": float(error),
+                        "maxRelError": float(error / max(np.max(np.abs(reference)), np.finfo(float).tiny))}
+    return report
@@ -0,0 +1,131 @@
+""" Restarted GMRES for the panel systems too large to factor directly.
+
+    Dense LU of the (N+1)x(N+1) vortex panel system costs N^3/3 operations and a second copy of
+    the matrix, which dominates beyond a few thousand panels. GMRES only needs products with the
+    matrix, so each iteration costs one pass over it, and a good preconditioner keeps the
+    iteration count nearly independent of N. Several right hand sides are iterated in lockstep,
+    each with its own Krylov space, so every pass over the matrix serves all of them. The method
+    is right preconditioned, so the residuals it reports are those of the original system. See
+    Saad, 'Iterative Methods for Sparse Linear Systems' (2003), sections 6.5 and 9.3.
+"""
+
+import numpy as np
+
+# Default relative residual norm at which the iteration stops
+KRYLOV_TOLERANCE = 1e-10
+
+# Krylov vectors kept before the iteration restarts from its current solution
+KRYLOV_RESTART = 60
+
+# Default bound on the total number of iterations
+KRYLOV_MAX_ITERATIONS = 600
+
+
+def gmres(matvec, rhs, initialGuess=None, preconditioner=None, tolerance=KRYLOV_TOLERANCE,
+          restart=KRYLOV_RESTART, maxIterations=KRYLOV_MAX_ITERATIONS):
+    """ Solve A x = rhs for every column of rhs, given matvec(X) = A X for (n, k) arrays X """
+    """ preconditioner(X) applies an approximate inverse of A to the columns of X. Columns stop
+        individually once their residual norm falls below tolerance times the norm of their rhs
+        column. Returns (x, report), where the report holds the "iterations" spent on each
+        column, its "residuals" history of relative residual norms starting from the initial
+        guess, the final relative "residual" computed from scratch and whether every column
+        "converged".
+    """
+    rhs = np.asarray(rhs)
+    vector = rhs.ndim == 1
+    b = rhs.reshape(len(rhs), -1)
+    n, k = b.shape
+    dtype = np.result_type(b, np.float32)
+    precondition = preconditioner if preconditioner is not None else (lambda X: X)
+
+    x = np.zeros((n, k), dtype=dtype) if initialGuess is None else \
+        np.array(initialGuess, dtype=dtype).reshape(n, k)
+    scale = np.linalg.norm(b, axis=0)
+    scale[scale == 0] = 1
+
+    residual = b - matvec(x)
+    norm = np.linalg.norm(residual, axis=0)
+    histories = [[value] for value in norm / scale]
+    iterations = np.zeros(k, dtype=int)
+    active = norm / scale > tolerance
+    total = 0
+
+    while active.any() and total < maxIterations:
+        steps = min(restart, maxIterations - total)
+        basis = np.zeros((steps + 1, n, k), dtype=dtype)
+        hessenberg = np.zeros((steps + 1, steps, k), dtype=dtype)
+        cosines = np.zeros((steps, k), dtype=dtype)
+        sines = np.zeros((steps, k), dtype=dtype)
+        projected = np.zeros((steps + 1, k), dtype=dtype)
+        projected[0] = norm
+        basis[0] = residual / np.where(norm > 0, norm, 1)
+        running = active.copy()
+
+        for j in range(steps):
+            # Arnoldi step by modified Gram-Schmidt; finished columns carry a zero vector along
+            w = matvec(precondition(basis[j] * running))
+            for i in range(j + 1):
+                hessenberg[i, j] = np.sum(w * basis[i], axis=0)
+                w -= hessenberg[i, j] * basis[i]
+            hessenberg[j + 1, j] = np.linalg.norm(w, axis=0)
+            basis[j + 1] = w / np.where(hessenberg[j + 1, j] > 0, hessenberg[j + 1, j], 1)
+
+            # Earlier Givens rotations, then a new one to zero the subdiagonal entry
+            for i in range(j):
+                upper = cosines[i] * hessenberg[i, j] + sines[i] * hessenberg[i + 1, j]
+                hessenberg[i + 1, j] = cosines[i] * hessenberg[i + 1, j] - sines[i] * hessenberg[i, j]
+                hessenberg[i, j] = upper
+            radius = np.hypot(hessenberg[j, j], hessenberg[j + 1, j])
+            radius[radius == 0] = 1
+            cosines[j] = hessenberg[j, j] / radius
+            sines[j] = hessenberg[j + 1, j] / radius
+            hessenberg[j, j] = radius
+            hessenberg[j + 1, j] = 0
+            projected[j + 1] = -sines[j] * projected[j]
+            projected[j] *= cosines[j]
+
+            iterations += running
+            total += 1
+            estimate = np.abs(projected[j + 1]) / scale
+            for column in np.flatnonzero(running):
+                histories[column].append(estimate[column])
+            running &= estimate > tolerance
+            if not running.any():
+                break
+
+        # Least squares update from the triangular system of each column
+        size = j + 1
+        update = np.zeros((n, k), dtype=dtype)
+        for column in np.flatnonzero(active):
+            y = np.linalg.solve(np.triu(hessenberg[:size, :size, column]), projected[:size, column])
+            update[:, column] = np.tensordot(y, basis[:size, :, column], axes=1)
+        x += precondition(update)
+
+        residual = b - matvec(x)
+        norm = np.linalg.norm(residual, axis=0)
+        active &= norm / scale > tolerance
+
+    relative = np.linalg.norm(b - matvec(x), axis=0) / scale
+    report = {"iterations": iterations.tolist(), "residuals": histories, "residual": relative.tolist(),
+              "converged": bool(np.all(relative <= tolerance))}
+    return (x[:, 0] if vector else x), report
+
+
+def blockJacobi(matrix, blockSize):
+    """ Preconditioner applying the inverses of the blockSize diagonal blocks of a square matrix to (n, k) arrays """
+    n = len(matrix)
+    full = n // blockSize * blockSize
+    starts = np.arange(0, full, blockSize)
+    local = np.arange(blockSize)
+    blocks = matrix[starts[:, None, None] + local[:, None], starts[:, None, None] + local]
+    inverses = np.linalg.inv(blocks) if len(starts) else blocks
+    tail = np.linalg.inv(matrix[full:, full:]) if full < n else None
+
+    def apply(X):
+        result = np.empty_like(X)
+        shape = (len(starts), blockSize) + X.shape[1:]
+        result[:full] = np.matmul(inverses, X[:full].reshape(shape)).reshape(X[:full].shape)
+        if tail is not None:
+            result[full:] = tail @ X[full:]
+        return result
+    return apply
@@ -1,11 +1,11 @@
 #!/usr/bin/env python
+""" Lift curves of three NACA airfoils. Run from the repository root: python -m CFD.lift_slope_analysis """
 
-from numpy.lib.function_base import angle
-from NACA_4_Digit import Naca4Digit
+from CFD.NACA_4_Digit import Naca4Digit
 import matplotlib.pyplot as plt
 import numpy as np
+import os
 
-VELOCITY = 55
 POINTS = 100
 
 def main():
@@ -13,32 +13,18 @@ def main():
     naca2412 = Naca4Digit(0.02, 0.40, 0.12, 1, POINTS)
     naca4412 = Naca4Digit(0.04, 0.40, 0.12, 1, POINTS)
 
-    naca0012.setVelocity(VELOCITY)
-    naca2412.setVelocity(VELOCITY)
-    naca4412.setVelocity(VELOCITY)
-
-    cL0012, cL2412, cL4412 = [], [], []
-    anglesOfAttack = list(range(-4, 10)) 
+    anglesOfAttack = np.arange(-10, 20.25, 0.25)
 
     print("Beginning analysis")
 
-    for angleOfAttack in anglesOfAttack:
-
-        print(f"Running model for {angleOfAttack} degree AoA...")
-
-        naca0012.setAlpha(angleOfAttack*np.pi/180)
-        naca2412.setAlpha(angleOfAttack*np.pi/180)
-        naca4412.setAlpha(angleOfAttack*np.pi/180)
-
-        freeStream, cl0012, pressure, cp = naca0012.computeStreamlines()
-        freeStream, cl2412, pressure, cp = naca2412.computeStreamlines()
-        freeStream, cl4412, pressure, cp = naca4412.computeStreamlines()
-
-        cL0012.append(cl0012[0])
-        cL2412.append(cl2412[0])
-        cL4412.append(cl4412[0])
+    # The lift coefficient does not depend on the free stream velocity, and every angle of
+    # attack is solved from the same panel system in a single call
+    cL0012, cp = naca0012.polar(anglesOfAttack*np.pi/180)
+    cL2412, cp = naca2412.polar(anglesOfAttack*np.pi/180)
+    cL4412, cp = naca4412.polar(anglesOfAttack*np.pi/180)
 
-        print(cl0012, cl2412, cl4412)
+    for angleOfAttack, cl0012, cl2412, cl4412 in zip(anglesOfAttack, cL0012, cL2412, cL4412):
+        print(f"{angleOfAttack:6.2f} deg AoA: {cl0012:.4f} {cl2412:.4f} {cl4412:.4f}")
 
     print("\nModeling complete. Generating figure...")
 
@@ -50,10 +36,10 @@ def main():
     plt.legend(); plt.grid()
     plt.xlabel("Angle of Attack [deg]")
     plt.ylabel("Coefficient of Lift")
-    plt.savefig("lift_curve.jpg")
+    plt.savefig(os.path.join(os.path.dirname(os.path.abspath(__file__)), "lift_curve.jpg"))
 
     print("Complete. Figure saved as \'lift_curve.jpg\'")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
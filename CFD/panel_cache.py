@@ -0,0 +1,146 @@
+""" A persistent, content-addressed cache of panel solutions shared by every process on the machine.
+
+    Each entry is a single raw .npy array named after the hash of its key and read back through a
+    memory map. Entries are written to a temporary file and renamed into place, so concurrent
+    readers only ever see complete files, and the least recently used entries are evicted once
+    the directory grows past its size limit. Any filesystem error, from an unwritable directory
+    to an entry another process evicted or still has mapped, is treated as a miss.
+"""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# Cache location used by Naca4Digit unless told otherwise
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".panel_cache")
+
+# Size limit of the cache directory in bytes
+DEFAULT_CACHE_SIZE = 256 * 1024 ** 2
+
+# Fraction of the size limit the directory is trimmed down to on eviction
+EVICTION_LOW_WATER = 0.8
+
+
+class PanelCache:
+    """ A size-bounded LRU store of arrays on disk, safe to share between processes """
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, maxBytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.estimatedBytes = None
+
+
+    @staticmethod
+    def hashKey(*parts):
+        """ Content address of a key made of strings, numbers and arrays """
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(np.ascontiguousarray(part).tobytes() if isinstance(part, np.ndarray) else repr(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+
+    def path(self, key):
+        """ File holding the entry for a hashed key """
+        return os.path.join(self.directory, key + ".npy")
+
+
+    def get(self, key):
+        """ Memory-map the entry for a key, or return None on a miss """
+        path = self.path(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+        except (ValueError, OSError):
+            return None
+        # Recency only steers eviction, so a read-only cache directory still serves hits
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return array
+
+
+    def put(self, key, array):
+        """ Store an array under a key, then evict old entries if the cache is over its limit """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.save(file, np.ascontiguousarray(array))
+            # Measured before the rename, after which another process may evict the entry
+            written = os.path.getsize(temporary)
+            os.replace(temporary, self.path(key))
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            return
+
+        # Other processes write too, so the running total is re-measured whenever it looks full
+        if self.estimatedBytes is None:
+            self.estimatedBytes = self.size()
+        else:
+            self.estimatedBytes += written
+        if self.estimatedBytes > self.maxBytes:
+            self.evict()
+
+
+    def entries(self):
+        """ (last use, size, path) of every complete entry """
+        found = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return found
+        for name in names:
+            if not name.endswith(".npy"):
+                continue
+            try:
+                status = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            found.append((status.st_mtime, status.st_size, os.path.join(self.directory, name)))
+        return found
+
+
+    def size(self):
+        """ Total bytes held by the cache """
+        return sum(size for _, size, _ in self.entries())
+
+
+    def evict(self):
+        """ Remove least recently used entries until the cache is under its low water mark """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= EVICTION_LOW_WATER * self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Still mapped by a reader on Windows; it stays until a later eviction
+                continue
+            total -= size
+        self.estimatedBytes = total
+
+
+    def clear(self):
+        """ Remove every entry that is not in use """
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.estimatedBytes = None
+
+
+# The cache every airfoil uses by default; one instance per process keeps its running size total,
+# so a store only rescans the directory when the cache looks full
+defaultCache = PanelCache()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+""" Headless design-space sweep over the NACA 4-digit catalog.
+
+    Every (airfoil x angle of attack x velocity) point is solved on a process pool. Work is
+    split into jobs of several airfoils; each worker builds an airfoil's panel system once and
+    reuses it for every angle of attack and velocity. With --solver gmres, meant for large panel
+    counts, each airfoil's solve is warm started from the previous, similar airfoil. Finished
+    jobs are written as columnar .npz shards in the output directory, so an interrupted sweep
+    picks up where it left off when the same command is run again. Run from the repository
+    root, e.g.
+
+        python -m CFD.sweep results/catalog --alpha -5 10 0.5 --velocities 30 55
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from CFD.NACA_4_Digit import Naca4Digit, SOLVERS
+
+# Sea level air density used for the dimensional lift column [kg/m^3]
+SEA_LEVEL_DENSITY = 1.225
+
+MANIFEST = "sweep.json"
+
+
+def catalog(cambers, locations, thicknesses):
+    """ Every (m, p, t) combination of the given percent camber, tenths location and percent thickness """
+    m, p, t = np.meshgrid(np.asarray(cambers) / 100, np.asarray(locations) / 10, np.asarray(thicknesses) / 100,
+                          indexing='ij')
+    return m.ravel(), p.ravel(), t.ravel()
+
+
+def solveJob(m, p, t, c, N, alphas, velocities, storeCp=False, solver="direct"):
+    """ Solve a batch of airfoils over every angle of attack and velocity, returning result columns """
+    columns = {key: [] for key in ("m", "p", "t", "c", "N", "alpha", "velocity", "cl", "cpMin", "lift")}
+    pressureCoefficients = []
+    alphaGrid, velocityGrid = np.meshgrid(alphas, velocities, indexing='ij')
+    initialGamma = None
+    for airfoilM, airfoilP, airfoilT in zip(m, p, t):
+        airfoil = Naca4Digit(airfoilM, airfoilP, airfoilT, c, N)
+        airfoil.setSolver(solver)
+        airfoil.initialGamma = initialGamma
+        cl, cp = airfoil.polar(np.radians(alphas))
+        initialGamma = airfoil.getPanelSystem().gammaBasis
+
+        # The panel solution is independent of velocity, only the dimensional lift scales
+        rows = alphaGrid.size
+        columns["m"].append(np.full(rows, airfoilM))
+        columns["p"].append(np.full(rows, airfoilP))
+        columns["t"].append(np.full(rows, airfoilT))
+        columns["alpha"].append(alphaGrid.ravel())
+        columns["velocity"].append(velocityGrid.ravel())
+        columns["cl"].append(np.repeat(cl, len(velocities)))
+        columns["cpMin"].append(np.repeat(np.min(cp, axis=1), len(velocities)))
+        columns["lift"].append((0.5 * SEA_LEVEL_DENSITY * velocityGrid ** 2 * c * cl[:, None]).ravel())
+        if storeCp:
+            pressureCoefficients.append(np.repeat(cp, len(velocities), axis=0))
+
+    rows = sum(len(block) for block in columns["m"])
+    columns["c"] = [np.full(rows, float(c))]
+    columns["N"] = [np.full(rows, N)]
+    result = {key: np.concatenate(blocks) for key, blocks in columns.items()}
+    if storeCp:
+        result["cp"] = np.concatenate(pressureCoefficients)
+    return result
+
+
+def shardPath(directory, job):
+    """ File holding the results of one job """
+    return os.path.join(directory, f"shard_{job:06d}.npz")
+
+
+def writeShard(directory, job, columns):
+    """ Write a job's columns atomically so a crash never leaves a partial shard behind """
+    path = shardPath(directory, job)
+    temporary = path + ".tmp.npz"
+    np.savez(temporary, **columns)
+    os.replace(temporary, path)
+
+
+def loadSweep(directory):
+    """ Concatenate every finished shard of a sweep into one set of columns """
+    shards = sorted(name for name in os.listdir(directory) if name.startswith("shard_") and name.endswith(".npz")
+                    and not name.endswith(".tmp.npz"))
+    columns = {}
+    for name in shards:
+        with np.load(os.path.join(directory, name)) as shard:
+            for key in shard.files:
+                columns.setdefault(key, []).append(shard[key])
+    return {key: np.concatenate(blocks) for key, blocks in columns.items()}
+
+
+def runSweep(directory, cambers, locations, thicknesses, alphas, velocities, chord=1, N=100, jobSize=20,
+             workers=None, storeCp=False, solver="direct"):
+    """ Run (or resume) a sweep, writing shards to directory as jobs finish """
+    m, p, t = catalog(cambers, locations, thicknesses)
+    settings = {"cambers": list(map(float, cambers)), "locations": list(map(float, locations)),
+                "thicknesses": list(map(float, thicknesses)), "alphas": list(map(float, alphas)),
+                "velocities": list(map(float, velocities)), "chord": float(chord), "N": int(N),
+                "jobSize": int(jobSize), "storeCp": bool(storeCp), "solver": solver}
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest):
+        with open(manifest) as file:
+            if json.load(file) != settings:
+                raise ValueError(f"{directory} holds a sweep with different settings")
+    else:
+        with open(manifest, "w") as file:
+            json.dump(settings, file, indent=2)
+
+    jobs = [(job, slice(start, start + jobSize)) for job, start in enumerate(range(0, len(m), jobSize))]
+    pending = [(job, span) for job, span in jobs if not os.path.exists(shardPath(directory, job))]
+    print(f"{len(m)} airfoils in {len(jobs)} jobs, {len(jobs) - len(pending)} already complete")
+
+    begin = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(solveJob, m[span], p[span], t[span], chord, N, np.asarray(alphas),
+                               np.asarray(velocities), storeCp, solver): job for job, span in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            writeShard(directory, futures[future], future.result())
+            print(f"\r{done}/{len(pending)} jobs, {time.perf_counter() - begin:.1f} s", end="", flush=True)
+    print()
+
+
+def main(argv=None):
+    """ Command line entry point """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("output", help="directory for result shards; rerun with the same settings to resume")
+    parser.add_argument("--camber", type=float, nargs=2, default=(0, 9), metavar=("MIN", "MAX"),
+                        help="maximum camber range in percent of chord")
+    parser.add_argument("--location", type=float, nargs=2, default=(0, 9), metavar=("MIN", "MAX"),
+                        help="maximum camber location range in tenths of chord")
+    parser.add_argument("--thickness", type=float, nargs=2, default=(1, 40), metavar=("MIN", "MAX"),
+                        help="maximum thickness range in percent of chord")
+    parser.add_argument("--alpha", type=float, nargs=3, default=(-5, 10, 1), metavar=("START", "STOP", "STEP"),
+                        help="angle of attack schedule in degrees, inclusive")
+    parser.add_argument("--velocities", type=float, nargs="+", default=[55], help="free stream velocities [m/s]")
+    parser.add_argument("--chord", type=float, default=1)
+    parser.add_argument("--panels", type=int, default=100)
+    parser.add_argument("--job-size", type=int, default=20, help="airfoils per worker job")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--store-cp", action="store_true", help="also store the Cp distribution of every row")
+    parser.add_argument("--solver", choices=SOLVERS, default="direct",
+                        help="panel system solver; gmres scales to thousands of panels")
+    args = parser.parse_args(argv)
+
+    start, stop, step = args.alpha
+    try:
+        runSweep(args.output,
+                 np.arange(args.camber[0], args.camber[1] + 1),
+                 np.arange(args.location[0], args.location[1] + 1),
+                 np.arange(args.thickness[0], args.thickness[1] + 1),
+                 np.arange(start, stop + step / 2, step), args.velocities, args.chord, args.panels, args.job_size,
+                 args.workers, args.store_cp, args.solver)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+""" Closed form thin airfoil theory for NACA 4-digit sections.
+
+    Thin airfoil theory replaces the section by a vortex sheet on its mean camber line and
+    expands the sheet strength in the Fourier series of the camber slope over
+    x = c*(1 - cos(theta))/2. The NACA 4-digit camber line is two parabolas joined at the
+    maximum camber location p, so its slope is dz/dx = k*(2p - 1 + cos(theta)), with
+    k = m/p^2 ahead of p and m/(1 - p)^2 behind it, and every Fourier integral has a closed
+    form. The estimate ignores thickness, so it is an instant preview of the panel solution
+    rather than a substitute for it. See Anderson, 'Fundamentals of Aerodynamics', section 4.8.
+"""
+
+import math
+import numpy as np
+
+# Fourier coefficients of the camber slope kept for the loading distribution
+THIN_AIRFOIL_TERMS = 64
+
+
+def cosineIntegral(n, theta):
+    """ Integral of cos(n*t) for t from 0 to theta, for integer arrays n """
+    n = np.asarray(n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(n == 0, theta, np.sin(n * theta) / n)
+
+
+def slopeIntegrals(m, p, n):
+    """ Integrals of dz/dx*cos(n*theta) over the chord, theta from 0 to pi, of a NACA 4-digit camber line """
+    def partial(theta):
+        # Integral of (2p - 1 + cos(t))*cos(n*t) from 0 to theta
+        return (2 * p - 1) * cosineIntegral(n, theta) + 0.5 * (cosineIntegral(n - 1, theta)
+                                                              + cosineIntegral(n + 1, theta))
+
+    thetaCamber = math.acos(1 - 2 * p)
+    integrals = np.zeros(np.shape(n))
+    if m == 0:
+        return integrals
+    if p > 0:
+        integrals += m / p ** 2 * partial(thetaCamber)
+    if p < 1:
+        integrals += m / (1 - p) ** 2 * (partial(math.pi) - partial(thetaCamber))
+    return integrals
+
+
+class ThinAirfoil:
+    """ Thin airfoil theory solution of a NACA 4-digit camber line, for any angle of attack """
+    """ Angles are in radians. The Fourier coefficients of the camber slope are computed once,
+        after which every method is a broadcast over the angles of attack given.
+    """
+    def __init__(self, m, p, c=1, terms=THIN_AIRFOIL_TERMS):
+        self.chord = c
+        integrals = slopeIntegrals(m, p, np.arange(terms + 1))
+
+        # A0 = alpha - camberAngle and An = 2/pi*integral n for n >= 1
+        self.camberAngle = integrals[0] / math.pi
+        self.coefficients = 2 / math.pi * integrals[1:]
+        self.zeroLiftAngle = (integrals[0] - integrals[1]) / math.pi
+
+
+    def liftCoefficient(self, alphas):
+        """ CL = 2*pi*(alpha - zeroLiftAngle) at each angle of attack """
+        return 2 * math.pi * (np.asarray(alphas, dtype=float) - self.zeroLiftAngle)
+
+
+    def momentCoefficient(self, alphas):
+        """ Moment coefficient about the quarter chord, the same at every angle of attack """
+        return np.full(np.shape(alphas), math.pi / 4 * (self.coefficients[1] - self.coefficients[0]))
+
+
+    def pressureDifference(self, alphas, x):
+        """ Loading Cp_lower - Cp_upper at chordwise stations x, of shape (n_alpha, n_x) """
+        """ The loading is 4*(A0*cot(theta/2) + sum(An*sin(n*theta))); it is infinite at the
+            leading edge and zero at the trailing edge.
+        """
+        theta = np.arccos(1 - 2 * np.clip(np.ravel(x) / self.chord, 0, 1))
+        with np.errstate(divide='ignore'):
+            leadingEdge = 4 / np.tan(theta / 2)
+        terms = np.arange(1, len(self.coefficients) + 1)
+        camberLoading = 4 * np.sin(np.outer(theta, terms)) @ self.coefficients
+        A0 = np.atleast_1d(np.asarray(alphas, dtype=float)) - self.camberAngle
+        return np.outer(A0, leadingEdge) + camberLoading
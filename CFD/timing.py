@@ -0,0 +1,100 @@
+""" Lightweight, always-on timing of the analysis pipeline stages.
+
+    Code under measurement wraps each stage in a span,
+
+        with timing.span("linear solve"):
+            ...
+
+    which records its wall time in the shared recorder. The recorder keeps a rolling window of
+    durations per stage for percentile summaries and a bounded list of recent spans that can be
+    exported as a Chrome trace (chrome://tracing or https://ui.perfetto.dev) to see which stage
+    dominates. Spans may be opened from any thread.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Durations kept per stage for the rolling percentiles
+ROLLING_WINDOW = 200
+
+# Most recent spans kept for trace export
+TRACE_LENGTH = 20000
+
+
+class StageTimer:
+    """ Records named timing spans and summarizes them """
+    def __init__(self, window=ROLLING_WINDOW, traceLength=TRACE_LENGTH):
+        self.window = window
+        self.lock = threading.Lock()
+        self.durations = OrderedDict()
+        self.events = deque(maxlen=traceLength)
+        self.origin = time.perf_counter()
+
+
+    @contextmanager
+    def span(self, name):
+        """ Time the enclosed block as one occurrence of stage name """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start)
+
+
+    def record(self, name, start, duration):
+        """ Add a span that began at perf_counter() time start and lasted duration seconds """
+        with self.lock:
+            if name not in self.durations:
+                self.durations[name] = deque(maxlen=self.window)
+            self.durations[name].append(duration)
+            self.events.append((name, start, duration, threading.get_ident()))
+
+
+    def percentiles(self, name, quantiles=(50, 90, 99)):
+        """ Rolling percentiles of a stage's durations in seconds, or None if it never ran """
+        with self.lock:
+            durations = list(self.durations.get(name, ()))
+        if not durations:
+            return None
+        return np.percentile(durations, quantiles)
+
+
+    def summary(self, quantiles=(50, 90, 99)):
+        """ One line per stage with its count and rolling percentiles in milliseconds """
+        with self.lock:
+            stages = [(name, list(durations)) for name, durations in self.durations.items()]
+        header = f"{'stage':<22}{'n':>5}" + "".join(f"{'p' + str(q):>9}" for q in quantiles)
+        lines = [header]
+        for name, durations in stages:
+            values = 1000 * np.percentile(durations, quantiles)
+            lines.append(f"{name:<22}{len(durations):>5}" + "".join(f"{value:>9.2f}" for value in values))
+        return lines
+
+
+    def exportTrace(self, path):
+        """ Write the recorded spans to path in the Chrome trace event format """
+        with self.lock:
+            events = list(self.events)
+        trace = [{"name": name, "ph": "X", "ts": 1e6 * (start - self.origin), "dur": 1e6 * duration,
+                  "pid": os.getpid(), "tid": thread} for name, start, duration, thread in events]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
+        return len(trace)
+
+
+    def reset(self):
+        """ Forget every recorded span """
+        with self.lock:
+            self.durations.clear()
+            self.events.clear()
+
+
+# Shared recorder used throughout the application
+timer = StageTimer()
+span = timer.span
@@ -0,0 +1,72 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+
+class AnalysisWorker(QObject):
+    """ Solves flow analyses on a background thread and hands the results back by signal """
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, str)
+
+    @pyqtSlot(object)
+    def compute(self, request):
+        """ Solve the panel system and evaluate the fields needed for plotting """
+        airfoil, vInf, alpha, altitude = request
+        try:
+            solution = airfoil.computeStreamlines(vInf=vInf, alpha=alpha, altitude=altitude)
+            solution.streamFunction
+            solution.pressure
+        except Exception as error:
+            self.failed.emit(request, str(error))
+        else:
+            self.finished.emit(request, solution)
+
+
+class AnalysisRunner(QObject):
+    """ Runs one analysis at a time off the GUI thread, coalescing requests made while it is busy """
+    """ Only the most recent request made during a running analysis is kept, so after a burst of
+        slider events at most one stale analysis finishes before the latest one starts.
+    """
+    dispatched = pyqtSignal(object)
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.busy = False
+        self.pending = None
+
+        self.thread = QThread()
+        self.worker = AnalysisWorker()
+        self.worker.moveToThread(self.thread)
+        self.dispatched.connect(self.worker.compute)
+        self.worker.finished.connect(self.onFinished)
+        self.worker.failed.connect(self.onFailed)
+        self.thread.start()
+
+    def request(self, airfoil, vInf, alpha, altitude=0):
+        """ Queue an analysis, replacing any request still waiting """
+        self.pending = (airfoil, vInf, alpha, altitude)
+        if not self.busy:
+            self.dispatchPending()
+
+    def dispatchPending(self):
+        """ Hand the waiting request, if any, to the worker """
+        request, self.pending = self.pending, None
+        self.busy = request is not None
+        if self.busy:
+            self.dispatched.emit(request)
+
+    def onFinished(self, request, solution):
+        """ Forward a result and start the next waiting request """
+        self.dispatchPending()
+        self.finished.emit(request, solution)
+
+    def onFailed(self, request, message):
+        """ Forward a failure and start the next waiting request """
+        self.dispatchPending()
+        self.failed.emit(request, message)
+
+    def shutdown(self):
+        """ Stop the worker thread once its current analysis is done """
+        self.pending = None
+        self.thread.quit()
+        self.thread.wait()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+""" Headless export of flow field animations over an angle of attack and velocity schedule.
+
+    The airfoil's panel system is solved once, in this process, and handed to a pool of worker
+    processes. Each worker builds the basis fields on its grid once and then renders its share
+    of the frames on the Agg backend with the application's FlowRenderer, so the static parts
+    of the figure are drawn once per worker and every frame only blits the contours over them.
+    The pressure contour levels are fixed across the animation so colors compare between
+    frames. Frames are written as numbered PNG files, or assembled into a GIF when the output
+    ends in .gif. Run from the repository root, e.g.
+
+        python -m GUI.animation_export alpha.gif --naca 2412 --alpha -5 15 --frames 81
+        python -m GUI.animation_export frames/ --alpha 5 5 --velocity 10 60 --workers 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+from CFD.NACA_4_Digit import Naca4Digit, PanelSystem
+from GUI.flow_renderer import FlowRenderer
+
+# Pressure contour levels shared by every frame
+PRESSURE_LEVELS = 40
+
+# Frames handed to a worker at a time
+FRAMES_PER_TASK = 4
+
+# This worker process's airfoil, renderer and canvas, set up by startWorker
+worker = {}
+
+
+class FrameCanvas(FigureCanvasAgg):
+    """ Off screen counterpart of the GUI's MplCanvas """
+    def __init__(self, width=8, height=4.5, dpi=100):
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        self.fig.patch.set_facecolor('black')
+        self.axes = self.fig.add_subplot(111)
+        self.axes.set_facecolor('black')
+        super().__init__(self.fig)
+
+
+def schedule(alphaRange, velocityRange, frames):
+    """ (alpha [rad], velocity [m/s]) of each frame, both varying linearly from start to stop """
+    alphas = np.radians(np.linspace(alphaRange[0], alphaRange[1], frames))
+    velocities = np.linspace(velocityRange[0], velocityRange[1], frames)
+    return list(zip(alphas.tolist(), velocities.tolist()))
+
+
+def startWorker(parameters, packed, resolution, size, dpi):
+    """ Pool initializer: rebuild the solved airfoil and a renderer in this worker """
+    airfoil = Naca4Digit(*parameters)
+    airfoil.panelCache = None
+    airfoil.panelSystem = PanelSystem.fromArray(packed)
+    airfoil.setGrid(resolution=resolution)
+    canvas = FrameCanvas(*size, dpi=dpi)
+    label = canvas.fig.text(0.02, 0.02, "", color='white', animated=True)
+    worker.update(airfoil=airfoil, canvas=canvas, renderer=FlowRenderer(canvas), label=label)
+
+
+def pressureRange(frame):
+    """ Lowest and highest pressure [kPa] over the grid in one (alpha, velocity) frame """
+    alpha, velocity = frame
+    pressure = worker["airfoil"].computeStreamlines(vInf=velocity, alpha=alpha).pressure
+    return float(np.min(pressure)), float(np.max(pressure))
+
+
+def renderFrame(task):
+    """ Render one frame to a PNG file, returning its path """
+    path, alpha, velocity, levels = task
+    airfoil = worker["airfoil"]
+    renderer = worker["renderer"]
+    renderer.pressureLevels = levels
+    solution = airfoil.computeStreamlines(vInf=velocity, alpha=alpha)
+    renderer.update(airfoil, solution)
+
+    label = worker["label"]
+    label.set_text(f"{airfoil.name}   alpha = {np.degrees(alpha):6.2f} deg   V = {velocity:6.2f} m/s   "
+                   f"CL = {solution.liftCoefficient:.3f}")
+    canvas = worker["canvas"]
+    canvas.fig.draw_artist(label)
+    Image.fromarray(np.asarray(canvas.buffer_rgba())).convert("RGB").save(path)
+    return path
+
+
+def renderAnimation(output, parameters, frames, resolution=(200, 200), size=(8, 4.5), dpi=100, fps=15,
+                    workers=None):
+    """ Render every (alpha, velocity) frame of an airfoil's flow to output on a process pool """
+    """ parameters are Naca4Digit's (m, p, t, c, N). output is a directory for the numbered PNG
+        frames, or a .gif file. Returns the list of frame files written (removed again for a GIF).
+    """
+    airfoil = Naca4Digit(*parameters)
+    packed = airfoil.getPanelSystem().toArray()
+    workers = workers or os.cpu_count()
+    chunk = max(1, min(FRAMES_PER_TASK, len(frames) // workers))
+    animated = output.lower().endswith(".gif")
+
+    with tempfile.TemporaryDirectory() as scratch, \
+            ProcessPoolExecutor(max_workers=workers, initializer=startWorker,
+                                initargs=(parameters, packed, resolution, size, dpi)) as pool:
+        ranges = np.array(list(pool.map(pressureRange, frames, chunksize=chunk)))
+        levels = np.linspace(ranges[:, 0].min(), ranges[:, 1].max(), PRESSURE_LEVELS)
+
+        directory = scratch if animated else output
+        os.makedirs(directory, exist_ok=True)
+        tasks = [(os.path.join(directory, f"frame_{index:05d}.png"), alpha, velocity, levels)
+                 for index, (alpha, velocity) in enumerate(frames)]
+        paths = list(pool.map(renderFrame, tasks, chunksize=chunk))
+
+        if animated:
+            images = (Image.open(path) for path in paths)
+            first = next(images)
+            first.save(output, save_all=True, append_images=images, duration=round(1000 / fps), loop=0)
+    return paths
+
+
+def main(argv=None):
+    """ Command line entry point """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("output", help="directory for numbered PNG frames, or a .gif file")
+    parser.add_argument("--naca", default="2412", help="NACA 4-digit designation")
+    parser.add_argument("--chord", type=float, default=1, help="chord length [m]")
+    parser.add_argument("--panels", type=int, default=100, help="airfoil border points")
+    parser.add_argument("--alpha", type=float, nargs=2, default=(-5, 15), metavar=("START", "STOP"),
+                        help="angle of attack at the first and last frame in degrees")
+    parser.add_argument("--velocity", type=float, nargs=2, default=(40, 40), metavar=("START", "STOP"),
+                        help="free stream velocity at the first and last frame [m/s]")
+    parser.add_argument("--frames", type=int, default=41)
+    parser.add_argument("--grid", type=int, nargs=2, default=(200, 200), metavar=("NX", "NY"),
+                        help="field grid resolution")
+    parser.add_argument("--size", type=float, nargs=2, default=(8, 4.5), metavar=("WIDTH", "HEIGHT"),
+                        help="frame size in inches")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--fps", type=float, default=15, help="GIF frame rate")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    if len(args.naca) != 4 or not args.naca.isdigit():
+        parser.error(f"'{args.naca}' is not a NACA 4-digit designation")
+    if min(args.velocity) <= 0:
+        parser.error("velocities must be positive")
+    if args.frames < 1:
+        parser.error("at least one frame is needed")
+
+    digits = args.naca
+    parameters = (int(digits[0]) / 100, int(digits[1]) / 10, int(digits[2:]) / 100, args.chord, args.panels)
+    frames = schedule(args.alpha, args.velocity, args.frames)
+    start = time.perf_counter()
+    renderAnimation(args.output, parameters, frames, tuple(args.grid), tuple(args.size), args.dpi, args.fps,
+                    args.workers)
+    print(f"{len(frames)} frames written to {args.output} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
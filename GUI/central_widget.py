@@ -1,14 +1,20 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox, QSlider, QPlainTextEdit
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox, QSlider, QPlainTextEdit, QFileDialog
 from PyQt5.QtGui import QFont
 
-from PyQt5.QtCore import Qt
-from numpy.lib.index_tricks import index_exp
+from PyQt5.QtCore import Qt, QTimer
 
 from GUI.mpl_canvas import MplCanvas
+from GUI.analysis_worker import AnalysisRunner
+from GUI.flow_renderer import FlowRenderer
+from GUI.comparison_window import ComparisonWindow
 from CFD.NACA_4_Digit import Naca4Digit
+from CFD import timing
 
 import numpy as np
 
+# Fractional chord stations of the thin airfoil Cp preview; the loading is infinite at the leading edge
+PREVIEW_STATIONS = np.linspace(0.02, 1, 50)
+
 
 class CentralWidget(QWidget):
     def __init__(self, *args, **kwargs):
@@ -25,15 +31,17 @@ class CentralWidget(QWidget):
         self.c = 1 
         self.t = 12 
 
-        # Default airfoil (NACA 0012)
+        # Default airfoil (NACA 0012), drawn once the window is up
         self.airfoil = Naca4Digit(0, 0, 0.12, 1, 70)
-        self.showFigure()
 
         self.N = 100 
 
         # Status
         self.streamActive = False
 
+        # Analyses run off the GUI thread; slider events arriving mid-solve are coalesced
+        self.analysisRunner = AnalysisRunner(self)
+
         # Secondary Figure
         self.secondaryCanvas = MplCanvas(self, width=5.5, height=4, dpi=100)
         self.secondaryCanvas.setFixedSize(750, 440)
@@ -42,6 +50,12 @@ class CentralWidget(QWidget):
         self.tertiaryCanvas = MplCanvas(self, width=5.5, height=4, dpi=100)
         self.tertiaryCanvas.setFixedSize(640, 400)
 
+        # Reuses the stream and pressure plot artists between analyses
+        self.flowRenderer = FlowRenderer(self.secondaryCanvas, self.tertiaryCanvas)
+
+        # Side by side analyses of several airfoils, created when the first one is added
+        self.comparisonWindow = None
+
         #-----------------------------------------------------------------------
         # LAYOUTS
         #-----------------------------------------------------------------------
@@ -69,6 +83,10 @@ class CentralWidget(QWidget):
         velocitySliderLayout = QVBoxLayout()
         velocitySliderLayout.setContentsMargins(25, 0, 40, 0)
 
+        # Altitude slider
+        altitudeSliderLayout = QVBoxLayout()
+        altitudeSliderLayout.setContentsMargins(25, 0, 40, 0)
+
         statisticsLayout = QVBoxLayout()
         statisticsLayout.setContentsMargins(20, 0, 25, 85)
 
@@ -116,6 +134,17 @@ class CentralWidget(QWidget):
         self.velocitySliderLabel.setFont(QFont("Serif", 10))
         self.velocitySliderLabel.setStyleSheet("color:white;")
 
+        # Altitude slider & Label
+        altitudeSlider = QSlider(Qt.Horizontal)
+        altitudeSlider.setMinimum(0)
+        altitudeSlider.setMaximum(20000)
+        altitudeSlider.setSingleStep(100)
+        altitudeSlider.setPageStep(1000)
+        self.altitudeSliderLabel = QLabel("Altitude [m]")
+        self.altitudeSliderLabel.setAlignment(Qt.AlignCenter)
+        self.altitudeSliderLabel.setFont(QFont("Serif", 10))
+        self.altitudeSliderLabel.setStyleSheet("color:white;")
+
         # Combo box for camber value & label
         camberValues = np.linspace(0, 100, 101)
         self.camberValues = [str(c) for c in camberValues]
@@ -162,6 +191,9 @@ class CentralWidget(QWidget):
         plotButton = QPushButton("Set Airfoil")
         plotButton.setStyleSheet("color:White; background-color:rgb(25, 25, 25);")
 
+        compareButton = QPushButton("Add to Comparison")
+        compareButton.setStyleSheet("color:White; background-color:rgb(25, 25, 25);")
+
         clearButton = QPushButton("Clear")
         clearButton.setStyleSheet("color:White; background-color:rgb(25, 25, 25);")
 
@@ -185,7 +217,9 @@ class CentralWidget(QWidget):
         self.airVelocityLabel.setStyleSheet("color:White;")
 
         self.commandWindow = QPlainTextEdit()
-        self.commandWindow.setStyleSheet("background-color:rgb(60, 60, 60);")
+        self.commandWindow.setStyleSheet("color:white; background-color:rgb(60, 60, 60);")
+        self.commandWindow.setFont(QFont("mono", 9))
+        self.commandWindow.setReadOnly(True)
         self.commandWindow.setFixedSize(640, 250)
 
         #-----------------------------------------------------------------------
@@ -209,6 +243,7 @@ class CentralWidget(QWidget):
         airfoilOptionsLayout.addLayout(chordLayout)
         airfoilOptionsLayout.addWidget(plotButton)
         airfoilOptionsLayout.addWidget(analyzeButton)
+        airfoilOptionsLayout.addWidget(compareButton)
         airfoilOptionsLayout.addWidget(clearButton)
 
         statisticsLayout.addWidget(self.summaryLabel) 
@@ -220,9 +255,12 @@ class CentralWidget(QWidget):
         alphaSliderLayout.addWidget(self.alphaSliderLabel)
         velocitySliderLayout.addWidget(velocitySlider)
         velocitySliderLayout.addWidget(self.velocitySliderLabel)
+        altitudeSliderLayout.addWidget(altitudeSlider)
+        altitudeSliderLayout.addWidget(self.altitudeSliderLabel)
 
         sliderLayout.addLayout(alphaSliderLayout)
         sliderLayout.addLayout(velocitySliderLayout)
+        sliderLayout.addLayout(altitudeSliderLayout)
         sliderLayout.addLayout(statisticsLayout)
 
         parametersLayout.addLayout(airfoilOptionsLayout)
@@ -244,8 +282,10 @@ class CentralWidget(QWidget):
         #-----------------------------------------------------------------------
         alphaSlider.valueChanged.connect(self.alphaChanged)
         velocitySlider.valueChanged.connect(self.velocityChanged)
+        altitudeSlider.valueChanged.connect(self.altitudeChanged)
         plotButton.clicked.connect(self.setAirfoil)
         analyzeButton.clicked.connect(self.plotStreamLines)
+        compareButton.clicked.connect(self.addToComparison)
         # analyzeButton.clicked.connect(self.performFullAnalysis)
 
         camberComboBox.currentIndexChanged.connect(self.setCamber)
@@ -253,22 +293,38 @@ class CentralWidget(QWidget):
         airfoilThicknessComboBox.currentIndexChanged.connect(self.setThickness)
         chordComboBox.currentIndexChanged.connect(self.setChord)
         clearButton.clicked.connect(self.clearFigures)
+        self.analysisRunner.finished.connect(self.drawStreamLines)
+        self.analysisRunner.failed.connect(self.analysisFailed)
 
-        self.clearFigures()
+        # Figures are plotted after the first paint so the window shows without waiting for them
+        self.figuresPlotted = False
+
+    def paintEvent(self, event):
+        """ Schedule the initial plots once the window has been painted """
+        super().paintEvent(event)
+        if not self.figuresPlotted:
+            self.figuresPlotted = True
+            QTimer.singleShot(0, self.clearFigures)
 
     def alphaChanged(self, value):
         """ Update angle of attack """
         self.alphaSliderLabel.setText("Angle of Attack: {} deg".format(str(value)))
         self.airfoil.setAlpha(value*np.pi/180)
+        self.previewAnalysis()
         if self.streamActive:
             self.plotStreamLines()
+        if self.comparisonWindow is not None:
+            self.comparisonWindow.setFlow(self.airfoil.vInf, self.airfoil.alpha, self.airfoil.altitude)
 
     def velocityChanged(self, value):
         """ Update free stream velocity """
         self.velocitySliderLabel.setText("Velocity: {} [m/s]".format(str(value)))
         self.airfoil.setVelocity(value)
+        self.previewAnalysis()
         if self.streamActive:
             self.plotStreamLines()
+        if self.comparisonWindow is not None:
+            self.comparisonWindow.setFlow(self.airfoil.vInf, self.airfoil.alpha, self.airfoil.altitude)
 
     def setCamber(self, camberIndex):
         """ Update airfoil camber """
@@ -293,35 +349,82 @@ class CentralWidget(QWidget):
         self.primaryCanvas.draw()
 
     def setAirfoil(self):
-        """ Create airfoil """
+        """ Create airfoil in the current flow, analyzing it if the stream plot is active """
+        previous = self.airfoil
         self.airfoil = Naca4Digit(self.m, self.p, self.t, self.c, self.N)
+        self.airfoil.setVelocity(previous.vInf)
+        self.airfoil.setAlpha(previous.alpha)
+        self.airfoil.setAltitude(previous.altitude)
         self.showAirfoil()
+        self.previewAnalysis()
+        if self.streamActive:
+            self.plotStreamLines()
 
     def plotStreamLines(self):
+        """ Request an analysis of the current airfoil and flow, plotted when it finishes """
+        self.streamActive = True
+        self.analysisRunner.request(self.airfoil, self.airfoil.vInf, self.airfoil.alpha, self.airfoil.altitude)
+
+    def previewAnalysis(self):
+        """ Show the thin airfoil theory estimate for the current airfoil and flow until the panel solution arrives """
+        """ Thin airfoil theory has no thickness, so the surfaces carry equal and opposite halves
+            of its loading.
+        """
+        airfoil = self.airfoil
+        alpha = airfoil.alpha
+        with timing.span("thin airfoil"):
+            estimate = airfoil.thinAirfoil()
+            coefficientOfLift = float(estimate.liftCoefficient(alpha))
+            x = airfoil.chord*PREVIEW_STATIONS
+            loading = estimate.pressureDifference(alpha, x)[0]
+        self.flowRenderer.preview(airfoil, x, 0.5*loading, -0.5*loading)
+
+        self.summaryLabel.setText(f"Summary: {airfoil.name} (thin airfoil)\n")
+        self.coefficientOfLiftLabel.setText(f"\tSectional Lift Coefficient: {coefficientOfLift:.3f}")
+        self.angleOfAttackLabel.setText(f"\tAngle of Attack: {round(alpha*180/np.pi)} [deg]")
+        self.airVelocityLabel.setText(f"\tRelative Air Velocity: {airfoil.vInf} [m/s]")
+
+    def drawStreamLines(self, request, solution):
         """ Plot airfoil stream function """
-        self.clearFigures() 
-        self.airfoil.plotWashedAirfoil(self.secondaryCanvas)
-        coefficientOfLift, cp = self.airfoil.plotStream(self.secondaryCanvas, pressurePlot=True)
-        coefficientOfLift = round(coefficientOfLift[0], 3)
-
-        l = len(self.airfoil.xPts)
-        self.tertiaryCanvas.axes.plot(self.airfoil.xPts[:l//2], cp[:l//2], 'b', marker='o', linewidth=3.5, label="Lower Surface")
-        self.tertiaryCanvas.axes.plot(self.airfoil.xPts[l//2:-1], cp[l//2:], 'r', marker='o', linewidth=3.5, label="Upper Surface")
-        self.tertiaryCanvas.axes.legend()
-        self.tertiaryCanvas.axes.set_xlim((0, self.airfoil.chord))
-        self.tertiaryCanvas.axes.set_ylim((np.min(cp), np.max(cp)))
-        self.tertiaryCanvas.axes.invert_yaxis()
-        self.tertiaryCanvas.draw()
-
-        print(coefficientOfLift)
-        self.summaryLabel.setText(f"Summary: {self.airfoil.name}\n")
+        airfoil, vInf, alpha, altitude = request
+        # A solve still running when the airfoil was replaced would draw the old airfoil back
+        if airfoil is not self.airfoil:
+            return
+        self.flowRenderer.update(airfoil, solution)
+        coefficientOfLift = round(solution.liftCoefficient, 3)
+
+        self.showTimings(f"{airfoil.name}: CL = {coefficientOfLift} at {round(alpha*180/np.pi)} deg, {vInf} m/s, "
+                         f"{altitude} m")
+        self.summaryLabel.setText(f"Summary: {airfoil.name}\n")
         self.coefficientOfLiftLabel.setText(f"\tSectional Lift Coefficient: {coefficientOfLift}")
-        self.angleOfAttackLabel.setText(f"\tAngle of Attack: {round(self.airfoil.alpha*180/np.pi)} [deg]")
-        self.airVelocityLabel.setText(f"\tRelative Air Velocity: {self.airfoil.vInf} [m/s]")
-
-
-        self.secondaryCanvas.draw()
-        self.streamActive = True
+        self.angleOfAttackLabel.setText(f"\tAngle of Attack: {round(alpha*180/np.pi)} [deg]")
+        self.airVelocityLabel.setText(f"\tRelative Air Velocity: {vInf} [m/s]")
+
+    def addToComparison(self):
+        """ Add an airfoil with the selected parameters to the comparison window and show it """
+        if self.comparisonWindow is None:
+            self.comparisonWindow = ComparisonWindow()
+            self.comparisonWindow.setFlow(self.airfoil.vInf, self.airfoil.alpha, self.airfoil.altitude)
+        self.comparisonWindow.addAirfoil(Naca4Digit(self.m, self.p, self.t, self.c, self.N))
+        self.comparisonWindow.show()
+        self.comparisonWindow.raise_()
+
+    def analysisFailed(self, request, message):
+        """ Report an analysis that could not be completed """
+        self.commandWindow.appendPlainText(f"Analysis of {request[0].name} failed: {message}")
+
+    def showTimings(self, status):
+        """ Show a status line and the rolling stage timings in the command window """
+        lines = [status, "", "Stage timings [ms]"] + timing.timer.summary()
+        self.commandWindow.setPlainText("\n".join(lines))
+
+    def exportTimingTrace(self):
+        """ Save the recorded stage timings as a trace file """
+        path, _ = QFileDialog.getSaveFileName(self, "Export Timing Trace", "flow_gui_trace.json",
+                                              "Trace files (*.json)")
+        if path:
+            count = timing.timer.exportTrace(path)
+            self.commandWindow.appendPlainText(f"Wrote {count} timing spans to {path}")
 
     def showAirfoil(self):
         """ Plot the shape of the airfoil """
@@ -332,34 +435,15 @@ class CentralWidget(QWidget):
     def altitudeChanged(self, value):
         """ Change the altitude used in the std atm model """
         self.altitudeSliderLabel.setText(f"Altitude: {value} [m]")
+        self.airfoil.setAltitude(value)
+        if self.streamActive:
+            self.plotStreamLines()
+        if self.comparisonWindow is not None:
+            self.comparisonWindow.setFlow(self.airfoil.vInf, self.airfoil.alpha, self.airfoil.altitude)
 
     def clearFigures(self):
         self.primaryCanvas.axes.clear()
-        self.secondaryCanvas.axes.clear()
-        self.tertiaryCanvas.axes.clear()
-
-        self.tertiaryCanvas.axes.set_title("Coefficient of Pressure vs Fractional Chord Length", color='white')
-        self.tertiaryCanvas.axes.set_ylabel("Cp")
-        self.tertiaryCanvas.axes.set_xlabel("x/c")
-        self.tertiaryCanvas.axes.xaxis.label.set_color('white')
-        self.tertiaryCanvas.axes.yaxis.label.set_color('white')
-        self.tertiaryCanvas.axes.tick_params(axis='x', colors='grey')
-        self.tertiaryCanvas.axes.tick_params(axis='y', colors='grey')
-        self.tertiaryCanvas.axes.grid(True, color='gray', linestyle='-.')
-        self.tertiaryCanvas.axes.plot(np.linspace(-5, 10, 25), np.zeros(25,), 'white')
-        self.tertiaryCanvas.axes.set_xlim((-0.01*self.c, self.c*1.1))
-        
-        self.secondaryCanvas.axes.set_title("Stream Function", color='white')
-        self.secondaryCanvas.axes.set_xlabel("X [m]")
-        self.secondaryCanvas.axes.set_ylabel("Y [m]")
-        self.secondaryCanvas.axes.xaxis.label.set_color('white')
-        self.secondaryCanvas.axes.yaxis.label.set_color('white')
-        self.secondaryCanvas.axes.set_xlim((-2*self.airfoil.chord, 2*self.airfoil.chord))
-        self.secondaryCanvas.axes.tick_params(axis='x', colors='grey')
-        self.secondaryCanvas.axes.tick_params(axis='y', colors='grey')
-        # self.secondaryCanvas.axes.grid(True, color='gray', linestyle='-.')
+        self.flowRenderer.clear(self.c)
 
         self.airfoil.plotAirfoil(self.primaryCanvas)
         self.primaryCanvas.draw()
-        self.secondaryCanvas.draw()
-        self.tertiaryCanvas.draw()
\ No newline at end of file
@@ -0,0 +1,172 @@
+from PyQt5.QtWidgets import QWidget, QGridLayout, QHBoxLayout, QVBoxLayout, QLabel, QPushButton
+from PyQt5.QtGui import QFont
+from matplotlib.colors import to_hex
+
+from GUI.mpl_canvas import MplCanvas
+from GUI.analysis_worker import AnalysisRunner
+from GUI.flow_renderer import FlowRenderer
+
+import numpy as np
+
+# Airfoils that can be compared at once
+MAX_AIRFOILS = 4
+
+
+class ComparisonEntry:
+    """ One airfoil of a comparison with its own analysis thread, stream plot and Cp lines """
+    def __init__(self, airfoil, color, parent):
+        self.airfoil = airfoil
+        self.color = color
+        self.solution = None
+        self.runner = AnalysisRunner(parent)
+
+        self.canvas = MplCanvas(parent, width=5.5, height=3, dpi=100)
+        self.canvas.setFixedSize(560, 300)
+        self.renderer = FlowRenderer(self.canvas)
+        self.renderer.setAirfoil(airfoil)
+
+        self.label = QLabel(airfoil.name)
+        self.label.setFont(QFont("mono", 10))
+        self.label.setStyleSheet(f"color:{to_hex(color)};")
+
+        self.widget = QWidget()
+        layout = QVBoxLayout(self.widget)
+        layout.addWidget(self.canvas)
+        layout.addWidget(self.label)
+
+        self.lowerLine = None
+        self.upperLine = None
+
+
+class ComparisonWindow(QWidget):
+    """ Side by side analyses of several airfoils under the same flow """
+    """ Every airfoil has its own AnalysisRunner, so a flow change starts all of their solves at
+        once on separate threads and each plot updates as soon as its own result arrives. The Cp
+        distributions are overlaid on one set of axes, one color per airfoil.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setWindowTitle("Airfoil Comparison")
+        self.setStyleSheet("background-color: rgb(0, 0, 0);")
+
+        self.entries = []
+        self.vInf = 0
+        self.alpha = 0
+        self.altitude = 0
+
+        self.streamLayout = QGridLayout()
+
+        self.pressureCanvas = MplCanvas(self, width=5.5, height=4, dpi=100)
+        self.pressureCanvas.setFixedSize(640, 440)
+
+        self.statusLabel = QLabel("Add airfoils from the main window to compare them")
+        self.statusLabel.setFont(QFont("mono", 10))
+        self.statusLabel.setStyleSheet("color:white;")
+
+        clearButton = QPushButton("Clear Comparison")
+        clearButton.setStyleSheet("color:White; background-color:rgb(25, 25, 25);")
+
+        pressureLayout = QVBoxLayout()
+        pressureLayout.addWidget(self.pressureCanvas)
+        pressureLayout.addWidget(self.statusLabel)
+        pressureLayout.addWidget(clearButton)
+        pressureLayout.addStretch()
+
+        mainLayout = QHBoxLayout(self)
+        mainLayout.addLayout(self.streamLayout)
+        mainLayout.addLayout(pressureLayout)
+
+        clearButton.clicked.connect(self.clearAirfoils)
+        self.resetPressure()
+
+    def resetPressure(self):
+        """ Style the empty Cp axes """
+        FlowRenderer.stylePressureAxes(self.pressureCanvas.axes, 1)
+        self.pressureCanvas.axes.set_xlabel("x/c")
+        self.pressureCanvas.draw()
+
+    def addAirfoil(self, airfoil):
+        """ Add an airfoil to the comparison, replacing the oldest one when full """
+        if len(self.entries) == MAX_AIRFOILS:
+            self.removeEntry(self.entries[0])
+
+        used = {entry.color for entry in self.entries}
+        color = next(f"C{index}" for index in range(MAX_AIRFOILS + 1) if f"C{index}" not in used)
+        entry = ComparisonEntry(airfoil, color, self)
+        entry.runner.finished.connect(lambda request, solution, entry=entry: self.drawResult(entry, request, solution))
+        entry.runner.failed.connect(lambda request, message, entry=entry: self.analysisFailed(entry, message))
+
+        pressureAxes = self.pressureCanvas.axes
+        entry.lowerLine, = pressureAxes.plot([], [], color=color, linestyle='--', linewidth=2)
+        entry.upperLine, = pressureAxes.plot([], [], color=color, linewidth=2, label=airfoil.name)
+        pressureAxes.legend()
+
+        self.entries.append(entry)
+        self.layoutEntries()
+        self.requestAnalysis(entry)
+
+    def removeEntry(self, entry):
+        """ Stop an airfoil's analyses and remove its plots """
+        entry.runner.shutdown()
+        entry.runner.deleteLater()
+        entry.lowerLine.remove()
+        entry.upperLine.remove()
+        self.streamLayout.removeWidget(entry.widget)
+        entry.widget.setParent(None)
+        entry.widget.deleteLater()
+        self.entries.remove(entry)
+
+    def clearAirfoils(self):
+        """ Remove every airfoil from the comparison """
+        for entry in list(self.entries):
+            self.removeEntry(entry)
+        self.resetPressure()
+
+    def layoutEntries(self):
+        """ Arrange the stream plots in two columns """
+        for entry in self.entries:
+            self.streamLayout.removeWidget(entry.widget)
+        for index, entry in enumerate(self.entries):
+            self.streamLayout.addWidget(entry.widget, index // 2, index % 2)
+
+    def setFlow(self, vInf, alpha, altitude=0):
+        """ Analyze every airfoil at a new free stream velocity, angle of attack and altitude """
+        self.vInf = vInf
+        self.alpha = alpha
+        self.altitude = altitude
+        for entry in self.entries:
+            self.requestAnalysis(entry)
+
+    def requestAnalysis(self, entry):
+        """ Queue an analysis of one airfoil at the current flow; a still flow has nothing to plot """
+        if self.vInf > 0:
+            entry.runner.request(entry.airfoil, self.vInf, self.alpha, self.altitude)
+
+    def drawResult(self, entry, request, solution):
+        """ Plot one airfoil's finished analysis """
+        if entry not in self.entries:
+            return
+        airfoil, vInf, alpha, _ = request
+        entry.solution = solution
+        entry.renderer.update(airfoil, solution)
+        entry.label.setText(f"{airfoil.name}: CL = {solution.liftCoefficient:.3f} at "
+                            f"{round(alpha*180/np.pi)} deg, {vInf} m/s")
+
+        cp = solution.pressureCoefficient
+        l = len(airfoil.xPts)
+        entry.lowerLine.set_data(airfoil.xPts[:l//2, 0] / airfoil.chord, cp[:l//2, 0])
+        entry.upperLine.set_data(airfoil.xPts[l//2:-1, 0] / airfoil.chord, cp[l//2:, 0])
+
+        solved = [entry.solution.pressureCoefficient for entry in self.entries if entry.solution is not None]
+        self.pressureCanvas.axes.set_ylim((max(np.max(cp) for cp in solved), min(np.min(cp) for cp in solved)))
+        self.pressureCanvas.draw_idle()
+        self.statusLabel.setText("Dashed: lower surface, solid: upper surface")
+
+    def analysisFailed(self, entry, message):
+        """ Report an analysis that could not be completed """
+        entry.label.setText(f"{entry.airfoil.name}: analysis failed: {message}")
+
+    def shutdown(self):
+        """ Stop every analysis thread """
+        for entry in self.entries:
+            entry.runner.shutdown()
@@ -0,0 +1,187 @@
+from matplotlib.artist import Artist
+from matplotlib.patches import Patch
+import numpy as np
+
+from CFD import timing
+
+# Smallest Cp range shown for a preview [-]
+MINIMUM_PREVIEW_SPAN = 0.1
+
+
+def contourArtists(contourSet):
+    """ The drawable artists of a contour set (a single artist from matplotlib 3.8 on) """
+    return [contourSet] if isinstance(contourSet, Artist) else list(contourSet.collections)
+
+
+class FlowRenderer:
+    """ Draws analysis results onto the stream and pressure canvases without rebuilding them """
+    """ Axes styling, the washed airfoil and the colorbar frame are built once per airfoil. Each
+        new solution only replaces the contour sets and the Cp line data. The stream canvas is
+        updated by blitting the animated artists over a cached background, which is recaptured
+        whenever the canvas does a full draw. Without a pressure canvas only the stream plot is drawn.
+        Setting pressureLevels fixes the pressure contour levels, and so the colorbar, across
+        solutions instead of fitting them to each one.
+    """
+    def __init__(self, streamCanvas, pressureCanvas=None):
+        self.streamCanvas = streamCanvas
+        self.pressureCanvas = pressureCanvas
+        self.airfoil = None
+        self.background = None
+        self.cbar = None
+        self.airfoilArtists = []
+        self.contours = []
+        self.lowerLine = None
+        self.upperLine = None
+        self.pressureLevels = None
+        self.streamCanvas.mpl_connect('draw_event', self.captureBackground)
+
+    def animatedArtists(self):
+        """ Artists redrawn on every frame, in drawing order """
+        # The pressure fill covers the airfoil's fill but not its outline
+        artists = [artist for artist in self.airfoilArtists if isinstance(artist, Patch)]
+        artists += [artist for contourSet in self.contours for artist in contourArtists(contourSet)]
+        artists += [artist for artist in self.airfoilArtists if not isinstance(artist, Patch)]
+        if self.cbar is not None:
+            artists.append(self.cbar.ax)
+        return artists
+
+    def captureBackground(self, event):
+        """ Store the static part of the stream canvas after a full draw and put the frame back on it """
+        self.background = self.streamCanvas.copy_from_bbox(self.streamCanvas.fig.bbox)
+        for artist in self.animatedArtists():
+            self.streamCanvas.fig.draw_artist(artist)
+
+    def clear(self, chord):
+        """ Reset both canvases to their empty, styled state """
+        self.airfoil = None
+        self.contours = []
+        self.airfoilArtists = []
+        if self.cbar is not None:
+            self.cbar.remove()
+            self.cbar = None
+
+        self.lowerLine = None
+        self.upperLine = None
+        if self.pressureCanvas is not None:
+            self.stylePressureAxes(self.pressureCanvas.axes, chord)
+            self.pressureCanvas.draw()
+
+        streamAxes = self.streamCanvas.axes
+        streamAxes.clear()
+        streamAxes.set_title("Stream Function", color='white')
+        streamAxes.set_xlabel("X [m]")
+        streamAxes.set_ylabel("Y [m]")
+        streamAxes.xaxis.label.set_color('white')
+        streamAxes.yaxis.label.set_color('white')
+        streamAxes.set_xlim((-2*chord, 2*chord))
+        streamAxes.tick_params(axis='x', colors='grey')
+        streamAxes.tick_params(axis='y', colors='grey')
+        self.streamCanvas.draw()
+
+    def attachColorbar(self, contourSet):
+        """ Point the colorbar at a new contour set, moving its change callback over as Colorbar does """
+        # Colorbar.remove disconnects the callback of the current mappable, so it must be this one's
+        previous = self.cbar.mappable
+        previous.callbacks.disconnect(previous.colorbar_cid)
+        previous.colorbar = None
+        previous.colorbar_cid = None
+        contourSet.colorbar = self.cbar
+        contourSet.colorbar_cid = contourSet.callbacks.connect('changed', self.cbar.update_normal)
+        self.cbar.update_normal(contourSet)
+
+    @staticmethod
+    def stylePressureAxes(pressureAxes, chord):
+        """ Clear a set of Cp axes and give them the application's styling """
+        pressureAxes.clear()
+        pressureAxes.set_title("Coefficient of Pressure vs Fractional Chord Length", color='white')
+        pressureAxes.set_ylabel("Cp")
+        pressureAxes.set_xlabel("x/c")
+        pressureAxes.xaxis.label.set_color('white')
+        pressureAxes.yaxis.label.set_color('white')
+        pressureAxes.tick_params(axis='x', colors='grey')
+        pressureAxes.tick_params(axis='y', colors='grey')
+        pressureAxes.grid(True, color='gray', linestyle='-.')
+        pressureAxes.plot(np.linspace(-5, 10, 25), np.zeros(25,), 'white')
+        pressureAxes.set_xlim((-0.01*chord, chord*1.1))
+
+    def setAirfoil(self, airfoil):
+        """ Build the static artists for a new airfoil """
+        self.clear(airfoil.chord)
+        self.airfoil = airfoil
+        self.background = None
+        self.airfoilArtists = airfoil.plotWashedAirfoil(self.streamCanvas)
+        for artist in self.airfoilArtists:
+            artist.set_animated(True)
+        if self.pressureCanvas is None:
+            return
+
+        pressureAxes = self.pressureCanvas.axes
+        self.lowerLine, = pressureAxes.plot([], [], 'b', marker='o', linewidth=3.5, label="Lower Surface")
+        self.upperLine, = pressureAxes.plot([], [], 'r', marker='o', linewidth=3.5, label="Upper Surface")
+        pressureAxes.legend()
+        pressureAxes.set_xlim((0, airfoil.chord))
+
+    def preview(self, airfoil, x, lowerCp, upperCp):
+        """ Show an estimated Cp distribution, dashed, until the next solution replaces it """
+        if airfoil is not self.airfoil:
+            self.setAirfoil(airfoil)
+        if self.pressureCanvas is None:
+            return
+        self.lowerLine.set_data(x, lowerCp)
+        self.upperLine.set_data(x, upperCp)
+        for line in (self.lowerLine, self.upperLine):
+            line.set_linestyle('--')
+        cp = np.concatenate((lowerCp, upperCp))
+        # A symmetric section at zero incidence carries no loading, which would give an empty range
+        margin = max(MINIMUM_PREVIEW_SPAN - np.ptp(cp), 0)/2
+        self.pressureCanvas.axes.set_ylim((np.max(cp) + margin, np.min(cp) - margin))
+        self.pressureCanvas.draw_idle()
+
+    def update(self, airfoil, solution):
+        """ Show a new solution, redrawing only what depends on it """
+        if airfoil is not self.airfoil:
+            self.setAirfoil(airfoil)
+
+        for contourSet in self.contours:
+            for artist in contourArtists(contourSet):
+                artist.remove()
+        streamAxes = self.streamCanvas.axes
+        with timing.span("contouring"):
+            self.contours = [airfoil.contourPressure(streamAxes, solution, self.pressureLevels),
+                             airfoil.contourStream(streamAxes, solution)]
+        for contourSet in self.contours:
+            for artist in contourArtists(contourSet):
+                artist.set_animated(True)
+
+        if self.pressureCanvas is not None:
+            cp = solution.pressureCoefficient
+            l = len(airfoil.xPts)
+            self.lowerLine.set_data(airfoil.xPts[:l//2, 0], cp[:l//2, 0])
+            self.upperLine.set_data(airfoil.xPts[l//2:-1, 0], cp[l//2:, 0])
+            for line in (self.lowerLine, self.upperLine):
+                line.set_linestyle('-')
+            self.pressureCanvas.axes.set_ylim((np.max(cp), np.min(cp)))
+            self.pressureCanvas.draw_idle()
+
+        if self.cbar is None:
+            # The colorbar takes space from the stream axes, so the first frame is a full draw
+            self.cbar = self.streamCanvas.fig.colorbar(self.contours[0])
+            self.cbar.set_label("Pressure [kPa]", color="white")
+            self.cbar.ax.tick_params(axis='y', labelcolor="white")
+            self.cbar.ax.set_animated(True)
+            with timing.span("canvas draw"):
+                self.streamCanvas.draw()
+            return
+        # A colorbar keeps the levels of the contour set it was made from unless told otherwise
+        self.cbar.boundaries = self.contours[0].levels
+        self.cbar.values = self.contours[0].cvalues
+        self.attachColorbar(self.contours[0])
+
+        with timing.span("canvas draw"):
+            if self.background is None:
+                self.streamCanvas.draw()
+                return
+            self.streamCanvas.restore_region(self.background)
+            for artist in self.animatedArtists():
+                self.streamCanvas.fig.draw_artist(artist)
+            self.streamCanvas.blit(self.streamCanvas.fig.bbox)
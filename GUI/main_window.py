@@ -18,4 +18,17 @@ class MainWindow(QMainWindow):
         centralWidget = CentralWidget()
         self.setCentralWidget(centralWidget)
 
+        toolsMenu = menuBar.addMenu("Tools")
+        toolsMenu.setStyleSheet("color:white;")
+        toolsMenu.addAction("Export Timing Trace...", centralWidget.exportTimingTrace)
+
         self.setWindowTitle("")
+
+    def closeEvent(self, event):
+        """ Stop background work before the window closes """
+        self.centralWidget().analysisRunner.shutdown()
+        comparisonWindow = self.centralWidget().comparisonWindow
+        if comparisonWindow is not None:
+            comparisonWindow.shutdown()
+            comparisonWindow.close()
+        super().closeEvent(event)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+""" Benchmarks for the CFD kernels, with regression checks against a JSON baseline.
+
+    Covers border generation and panel assembly, with direct and GMRES solves, from 50 to 1600
+    panels, stream function fields from 50^2 to 1000^2 grid points, alpha sweeps of increasing
+    length and contour plotting on the headless Agg backend, so it runs on a machine without a
+    display. Each case records its best wall time over several runs, plus the peak traced
+    memory and the bytes and blocks it allocated (and still held on return) from a separate
+    tracemalloc run. Run from the repository root, e.g.
+
+        python -m benchmarks.cfd_benchmarks --save            # record benchmarks/baseline.json
+        python -m benchmarks.cfd_benchmarks                   # compare against it
+        python -m benchmarks.cfd_benchmarks --filter panel --threshold 0.1
+
+    Baselines are only comparable on the machine that recorded them. The comparison exits with
+    status 1 when a case is slower, or peaks higher in memory, than its baseline by more than
+    the threshold fraction.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from CFD.NACA_4_Digit import Naca4Digit, PanelSystem
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+PANEL_COUNTS = (50, 100, 200, 400, 800, 1600)
+GRID_SIZES = (50, 100, 200, 500, 1000)
+SWEEP_LENGTHS = (10, 100, 1000)
+PLOT_GRID_SIZES = (100, 300)
+
+# Cases are repeated until this much time has been spent on them, within the repeat bounds
+TIME_BUDGET = 0.5
+MIN_REPEATS = 3
+MAX_REPEATS = 50
+
+
+class Canvas:
+    """ Stand-in for the GUI's MplCanvas: a figure and one set of axes """
+    def __init__(self):
+        self.fig, self.axes = plt.subplots()
+
+
+def newAirfoil(N, gridSize=100):
+    """ A NACA 2412 with N border points and a square gridSize field grid, bypassing the disk cache """
+    airfoil = Naca4Digit(0.02, 0.4, 0.12, 1, N)
+    airfoil.panelCache = None
+    airfoil.setGrid(resolution=(gridSize, gridSize))
+    airfoil.setVelocity(40)
+    airfoil.setAlpha(np.radians(5))
+    return airfoil
+
+
+def borderCase(N):
+    """ calculateAirfoilBorder for N points """
+    airfoil = newAirfoil(N)
+    return lambda: airfoil.calculateAirfoilBorder(N)
+
+
+def panelCase(N):
+    """ Assemble and solve the panel system (vortexPanel) for N points """
+    airfoil = newAirfoil(N)
+    return lambda: Naca4Digit.vortexPanel(airfoil.xPts, airfoil.yPts, airfoil.vInf, airfoil.alpha)
+
+
+def gmresCase(N):
+    """ Assemble and solve the panel system for N points with the GMRES solver """
+    airfoil = newAirfoil(N)
+    return lambda: PanelSystem.fromBorder(airfoil.xPts, airfoil.yPts, solver="gmres")
+
+
+def sweepCase(count):
+    """ CL and Cp over count angles of attack on a 200 point border, including the panel solve """
+    airfoil = newAirfoil(200)
+    alphas = np.radians(np.linspace(-10, 20, count))
+    return lambda: PanelSystem.fromBorder(airfoil.xPts, airfoil.yPts).polar(alphas)
+
+
+def fieldCase(gridSize):
+    """ computeStreamlines stream function and pressure on a gridSize^2 grid around a 100 point border """
+    airfoil = newAirfoil(100, gridSize)
+    airfoil.getGrid()
+
+    def run():
+        airfoil.panelSystem = None
+        solution = airfoil.computeStreamlines()
+        return solution.streamFunction, solution.pressure
+    return run
+
+
+def plotCase(gridSize):
+    """ plotStream with the pressure contours on a gridSize^2 grid, drawn to an Agg canvas """
+    airfoil = newAirfoil(100, gridSize)
+    solution = airfoil.computeStreamlines()
+    solution.pressure
+    canvas = Canvas()
+
+    def run():
+        canvas.fig.clf()
+        canvas.axes = canvas.fig.add_subplot()
+        airfoil.cbar = None
+        airfoil.plotStream(canvas, pressurePlot=True, solution=solution)
+        canvas.fig.canvas.draw()
+    return run
+
+
+def cases():
+    """ Every benchmark as (name, setup), where setup builds the callable that is timed """
+    found = []
+    found += [(f"border/N={N}", lambda N=N: borderCase(N)) for N in PANEL_COUNTS]
+    found += [(f"panel/N={N}", lambda N=N: panelCase(N)) for N in PANEL_COUNTS]
+    found += [(f"gmres/N={N}", lambda N=N: gmresCase(N)) for N in PANEL_COUNTS]
+    found += [(f"sweep/alphas={count}", lambda count=count: sweepCase(count)) for count in SWEEP_LENGTHS]
+    found += [(f"field/grid={size}^2", lambda size=size: fieldCase(size)) for size in GRID_SIZES]
+    found += [(f"plot/grid={size}^2", lambda size=size: plotCase(size)) for size in PLOT_GRID_SIZES]
+    return found
+
+
+def measure(setup):
+    """ Best wall time over repeated runs, then peak memory and allocations from one traced run """
+    run = setup()
+    run()
+
+    times = []
+    while len(times) < MAX_REPEATS and (len(times) < MIN_REPEATS or sum(times) < TIME_BUDGET):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = run()
+    peak = tracemalloc.get_traced_memory()[1]
+    allocated = [stat for stat in tracemalloc.take_snapshot().compare_to(before, "filename") if stat.size_diff > 0]
+    tracemalloc.stop()
+    del result
+
+    return {"seconds": min(times), "medianSeconds": float(np.median(times)), "repeats": len(times),
+            "peakBytes": peak, "allocatedBytes": sum(stat.size_diff for stat in allocated),
+            "allocatedBlocks": sum(stat.count_diff for stat in allocated)}
+
+
+def environment():
+    """ Description of the machine and library versions a set of results was recorded with """
+    return {"python": platform.python_version(), "numpy": np.__version__, "matplotlib": matplotlib.__version__,
+            "machine": platform.machine(), "processor": platform.processor(), "cpus": os.cpu_count(),
+            "system": platform.platform()}
+
+
+def compare(results, baseline, threshold):
+    """ Names and descriptions of the cases that regressed past the threshold fraction """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for key, label in (("seconds", "time"), ("peakBytes", "peak memory")):
+            if reference[key] > 0 and result[key] > (1 + threshold) * reference[key]:
+                regressions.append(f"{name}: {label} {result[key] / reference[key]:.2f}x baseline")
+    return regressions
+
+
+def main(argv=None):
+    """ Command line entry point """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed fractional slowdown or memory growth before a case fails")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, setup in cases():
+        if args.filter not in name:
+            continue
+        results[name] = measure(setup)
+        result = results[name]
+        print(f"{name:<24}{1000 * result['seconds']:>11.3f} ms{result['peakBytes'] / 1024 ** 2:>11.2f} MiB peak"
+              f"{result['allocatedBlocks']:>9d} blocks", flush=True)
+
+    record = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(record, file, indent=2)
+    if args.save:
+        with open(args.baseline, "w") as file:
+            json.dump(record, file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save to record one")
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get("environment") != record["environment"]:
+        print("Warning: the baseline was recorded on a different machine or library versions")
+    regressions = compare(results, baseline["results"], args.threshold)
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    if not regressions:
+        print(f"No regressions past {args.threshold:.0%} against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
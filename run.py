@@ -1,8 +1,6 @@
 #!/usr/bin/env python
 
-from PyQt5.QtWidgets import QApplication
-from GUI.main_window import MainWindow
-
+import argparse
 import sys
 
 def main():
@@ -27,9 +25,37 @@ def main():
 
         6. Add in estimates for three dimensional aircraft, possibly provide
            values for obscure coefficients such as oswald's efficiency factor.
+
+        Without arguments the GUI is started. --serve or --socket instead run the headless
+        JSON-lines analysis service described in CFD/batch_service.py, which never imports
+        PyQt or matplotlib.
     """
+    parser = argparse.ArgumentParser(description="NACA airfoil analysis tool")
+    parser.add_argument("--serve", action="store_true", help="answer JSON-lines requests from stdin on stdout")
+    parser.add_argument("--socket", metavar="PATH", help="answer JSON-lines requests on a unix socket at PATH")
+    parser.add_argument("--workers", type=int, default=None, help="service worker processes (default: all cores)")
+    args, qtArguments = parser.parse_known_args()
+
+    if args.serve or args.socket:
+        serve(args)
+    else:
+        runGui([sys.argv[0]] + qtArguments)
+
+def serve(args):
+    """ Run the headless analysis service """
+    from CFD import batch_service
+    if args.socket:
+        batch_service.serveSocket(args.socket, args.workers)
+    else:
+        batch_service.serveStdin(sys.stdin, sys.stdout, args.workers)
+
+def runGui(argv):
+    """ Start the Qt application """
+    from PyQt5.QtWidgets import QApplication
+    from GUI.main_window import MainWindow
+
     # Create application
-    app = QApplication(sys.argv)
+    app = QApplication(argv)
     # Create Main window
     mainWindow = MainWindow()
     # Show the main window